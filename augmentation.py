@@ -0,0 +1,152 @@
+# import the necessary packages
+import config
+import torch
+import torch.nn.functional as F
+
+class BatchAugmentation:
+    """
+    Augments whole batches of normalized image tensors after collation, keeping
+    the normalized (startX, startY, endX, endY) targets consistent with the
+    flips and translation/scale jitter applied to each image.
+
+    Parameters:
+        hflip (float): Probability of flipping each image horizontally.
+        vflip (float): Probability of flipping each image vertically.
+        translate (float): Maximum shift as a fraction of the image size.
+        scale (tuple): (min, max) zoom factor range.
+        brightness (float): Maximum brightness offset in [0, 1] pixel units.
+        contrast (float): Maximum relative contrast change.
+        saturation (float): Maximum relative saturation change.
+        seed (int): Optional seed for reproducible augmentation.
+    """
+    def __init__(self, hflip=0.5, vflip=0.0, translate=0.1, scale=(0.9, 1.1),
+        brightness=0.2, contrast=0.2, saturation=0.2, seed=None):
+        self.hflip = hflip
+        self.vflip = vflip
+        self.translate = translate
+        self.scale = scale
+        self.brightness = brightness
+        self.contrast = contrast
+        self.saturation = saturation
+        # draw all random parameters from a dedicated CPU generator so a
+        # seeded run is reproducible regardless of the device
+        self.generator = torch.Generator()
+        if seed is not None:
+            self.generator.manual_seed(seed)
+        else:
+            self.generator.seed()
+
+    def _uniform(self, n, low, high):
+        return torch.rand(n, generator=self.generator) * (high - low) + low
+
+    def _shift_range(self, bboxes, s, hasBox):
+        # the (x, y) shifts allowed per sample after zooming by s, as (lo, hi)
+        # tensors of shape (N, 2); boxes must stay entirely inside [0, 1]
+        scaled = (bboxes - 0.5) * s.unsqueeze(1) + 0.5
+        lo = torch.full_like(scaled[:, :2], -self.translate)
+        hi = torch.full_like(scaled[:, :2], self.translate)
+        lo = torch.where(hasBox.unsqueeze(1), torch.max(lo, -scaled[:, :2]), lo)
+        hi = torch.where(hasBox.unsqueeze(1), torch.min(hi, 1 - scaled[:, 2:]),
+            hi)
+        return (lo, hi)
+
+    def __call__(self, images, bboxes):
+        """
+        Parameters:
+            images (torch.Tensor): Normalized batch of shape (N, 3, H, W).
+            bboxes (torch.Tensor): Normalized boxes of shape (N, 4). Rows of zeros
+                                   (no waldo) are left untouched, and shifts and
+                                   zooms never move a box out of the frame.
+
+        Returns:
+            tuple: (images, bboxes) augmented copies on the input device.
+        """
+        n = images.size(0)
+        device = images.device
+        images = images.clone()
+        bboxes = bboxes.clone()
+        hasBox = (bboxes[:, 2] > bboxes[:, 0]) & (bboxes[:, 3] > bboxes[:, 1])
+
+        # flip the selected images and mirror their box coordinates
+        flip = (torch.rand(n, generator=self.generator) < self.hflip).to(device)
+        images[flip] = images[flip].flip(-1)
+        bboxes[flip & hasBox] = torch.stack([1 - bboxes[:, 2], bboxes[:, 1],
+            1 - bboxes[:, 0], bboxes[:, 3]], dim=1)[flip & hasBox]
+        flip = (torch.rand(n, generator=self.generator) < self.vflip).to(device)
+        images[flip] = images[flip].flip(-2)
+        bboxes[flip & hasBox] = torch.stack([bboxes[:, 0], 1 - bboxes[:, 3],
+            bboxes[:, 2], 1 - bboxes[:, 1]], dim=1)[flip & hasBox]
+
+        # zoom around the image centre and shift; a point p in [0, 1] moves to
+        # (p - 0.5) * s + 0.5 + t, so the sampling grid uses the inverse map
+        s = self._uniform(n, self.scale[0], self.scale[1]).to(device)
+        # keep waldo boxes inside the frame: drop the zoom for boxes that no
+        # longer fit once scaled, then limit each shift to the free margin
+        (lo, hi) = self._shift_range(bboxes, s, hasBox)
+        s = torch.where((lo <= hi).all(dim=1), s, torch.ones_like(s))
+        (lo, hi) = self._shift_range(bboxes, s, hasBox)
+        u = torch.rand((n, 2), generator=self.generator).to(device)
+        t = lo + u * (hi - lo)
+        (tx, ty) = (t[:, 0], t[:, 1])
+        theta = torch.zeros((n, 2, 3), device=device)
+        theta[:, 0, 0] = 1 / s
+        theta[:, 1, 1] = 1 / s
+        theta[:, 0, 2] = -2 * tx / s
+        theta[:, 1, 2] = -2 * ty / s
+        grid = F.affine_grid(theta, list(images.size()), align_corners=False)
+        # zero padding in normalized space fills with the dataset mean colour
+        images = F.grid_sample(images, grid, padding_mode="zeros",
+            align_corners=False)
+        shift = torch.stack([tx, ty, tx, ty], dim=1)
+        moved = ((bboxes - 0.5) * s.unsqueeze(1) + 0.5 + shift).clamp(0, 1)
+        bboxes[hasBox] = moved[hasBox]
+
+        # apply colour jitter in [0, 1] pixel space and normalize again
+        mean = torch.tensor(config.MEAN, device=device).view(1, 3, 1, 1)
+        std = torch.tensor(config.STD, device=device).view(1, 3, 1, 1)
+        pixels = images * std + mean
+        b = self._uniform(n, -self.brightness, self.brightness)
+        c = self._uniform(n, 1 - self.contrast, 1 + self.contrast)
+        sat = self._uniform(n, 1 - self.saturation, 1 + self.saturation)
+        (b, c, sat) = [v.to(device).view(n, 1, 1, 1) for v in (b, c, sat)]
+        pixels = pixels + b
+        channelMean = pixels.mean(dim=(2, 3), keepdim=True)
+        pixels = (pixels - channelMean) * c + channelMean
+        gray = (0.299 * pixels[:, 0:1] + 0.587 * pixels[:, 1:2] +
+            0.114 * pixels[:, 2:3])
+        pixels = (pixels - gray) * sat + gray
+        images = (pixels.clamp(0, 1) - mean) / std
+
+        return (images, bboxes)
+
+
+if __name__ == "__main__":
+    # check that the box targets follow the warped images: draw white boxes
+    # on black images, including boxes clipped at the patch edges, augment
+    # them without colour jitter and compare the targets to the white pixels
+    size = 224
+    bboxes = torch.tensor([[0.0, 0.0, 0.3, 0.4], [0.6, 0.5, 1.0, 1.0],
+        [0.2, 0.3, 0.5, 0.6], [0.0, 0.4, 1.0, 0.7], [0.7, 0.0, 0.9, 0.2],
+        [0.1, 0.6, 0.4, 1.0], [0.0, 0.0, 0.0, 0.0], [0.45, 0.45, 0.55, 0.55]])
+    pixels = torch.zeros((len(bboxes), 3, size, size))
+    for (i, box) in enumerate((bboxes * size).round().int().tolist()):
+        pixels[i, :, box[1]:box[3], box[0]:box[2]] = 1.0
+    mean = torch.tensor(config.MEAN).view(1, 3, 1, 1)
+    std = torch.tensor(config.STD).view(1, 3, 1, 1)
+    augment = BatchAugmentation(hflip=0.5, vflip=0.5, brightness=0.0,
+        contrast=0.0, saturation=0.0, seed=42)
+    for _ in range(10):
+        (images, targets) = augment((pixels - mean) / std, bboxes)
+        mask = (images * std + mean).mean(dim=1) > 0.5
+        for i in range(len(bboxes)):
+            cols = mask[i].any(dim=0).nonzero().flatten()
+            rows = mask[i].any(dim=1).nonzero().flatten()
+            if len(cols) == 0:
+                assert targets[i].abs().sum() == 0, "empty box was moved"
+                continue
+            found = torch.tensor([cols.min(), rows.min(), cols.max() + 1,
+                rows.max() + 1]).float() / size
+            assert (found - targets[i]).abs().max() <= 2.0 / size, \
+                "box {} does not match the image: {} vs {}".format(i,
+                targets[i].tolist(), found.tolist())
+    print("[INFO] augmented boxes match the warped images")
@@ -0,0 +1,142 @@
+# USAGE
+# python cascade.py --input scene.jpg
+# python cascade.py --input scene.jpg --thresholds 0.1 0.3 0.5
+# import the necessary packages
+from inference import LazyDetector
+from inference import load_labels
+from inference import predict_images
+from inference import tile_origins
+from inference import crop_tiles
+from inference import tile_box_to_image
+from inference import fit_scene
+from inference import fitted_box_to_image
+from prediction_cache import PredictionCache
+import config
+import argparse
+import time
+import cv2
+
+def cascade_search(image, models, waldoIdx, stages=config.CASCADE_RES,
+	thresholds=config.CASCADE_THRESHOLDS, sceneSize=config.SCENE_SIZE,
+	caches=None):
+	"""
+	Searches a scene coarse-to-fine: the first stage scores every tile of the
+	scene and each later stage only scores the sub-tiles of the tiles that
+	passed the previous stage's threshold. The scene is first fitted to the
+	size the training patches were cut from so objects appear at the scale
+	the detectors were trained on.
+
+	Parameters:
+		image (ndarray): RGB scene image of any size.
+		models (dict): Resolution -> ObjectDetector (or LazyDetector) per stage.
+		waldoIdx (int): Index of the "waldo" class in the classifier output.
+		stages (list): Tile resolutions from coarsest to finest.
+		thresholds (dict): Resolution -> minimum waldo probability to keep a tile.
+		sceneSize (tuple): (width, height) the scene is fitted to before tiling.
+		caches (dict): Optional resolution -> PredictionCache for every stage.
+
+	Returns:
+		tuple: (detections, report). Detections are dicts with the "bbox" in the
+		       original scene, waldo "prob" and tile "origin" in the fitted
+		       scene of every tile kept at the final stage. The report holds
+		       the tiles evaluated and kept per stage.
+	"""
+	(image, scale, offset) = fit_scene(image, sceneSize)
+	(w, h) = sceneSize
+	regions = None
+	report = []
+	for res in stages:
+		tileSize = int(res)
+		# tile the full scene at the first stage, otherwise only the
+		# candidates carried over from the previous stage
+		if regions is None:
+			origins = tile_origins(w, h, tileSize)
+		else:
+			origins = []
+			for region in regions:
+				origins.extend(tile_origins(w, h, tileSize, region=region))
+		# once no tile passes, skip the remaining stages without ever
+		# loading their detectors
+		if len(origins) == 0:
+			keep = []
+			report.append({"res": res, "evaluated": 0, "kept": 0})
+			continue
+		cache = None if caches is None else caches[res]
+		(boxes, probs) = predict_images(models[res],
+			crop_tiles(image, origins, tileSize), cache=cache)
+		keep = (probs[:, waldoIdx] >= thresholds[res]).nonzero().flatten()
+		keep = keep.tolist()
+		report.append({"res": res, "evaluated": len(origins),
+			"kept": len(keep)})
+		regions = [origins[i] + (tileSize,) for i in keep]
+	# map the boxes of the tiles surviving the final stage back to scene
+	# coordinates
+	detections = [{"bbox": fitted_box_to_image(tile_box_to_image(boxes[i],
+		origins[i], tileSize), scale, offset),
+		"prob": float(probs[i, waldoIdx]), "origin": origins[i]}
+		for i in keep]
+	return (detections, report)
+
+
+if __name__ == "__main__":
+	# construct the argument parser and parse the arguments
+	ap = argparse.ArgumentParser()
+	ap.add_argument("-i", "--input", required=True,
+		help="path to input scene image")
+	ap.add_argument("-t", "--thresholds", type=float, nargs=3,
+		help="waldo probability thresholds for the 256, 128 and 64 stages")
+	ap.add_argument("-d", "--display", action="store_true",
+		help="whether to show the detections on the scene")
+	ap.add_argument("-n", "--no-cache", action="store_true",
+		help="disable the prediction cache")
+	args = vars(ap.parse_args())
+	thresholds = dict(config.CASCADE_THRESHOLDS)
+	if args["thresholds"] is not None:
+		thresholds = dict(zip(config.CASCADE_RES, args["thresholds"]))
+
+	# set up the object detector for every stage of the cascade; each one
+	# is only loaded once one of its tiles misses the prediction cache, so
+	# later stages are never loaded when no coarse tile passes
+	print("[INFO] loading object detectors...")
+	models = {}
+	caches = None if args["no_cache"] else {}
+	for res in config.CASCADE_RES:
+		models[res] = LazyDetector(config.MODEL_PATHS[res])
+		if caches is not None:
+			caches[res] = PredictionCache(config.MODEL_PATHS[res])
+	le = load_labels(config.MODEL_PATHS[config.CASCADE_RES[0]])
+	waldoIdx = list(le.classes_).index("waldo")
+
+	# load the scene and run the cascade over it
+	orig = cv2.imread(args["input"])
+	image = cv2.cvtColor(orig, cv2.COLOR_BGR2RGB)
+	startTime = time.time()
+	(detections, report) = cascade_search(image, models, waldoIdx,
+		thresholds=thresholds, caches=caches)
+	endTime = time.time()
+
+	# report how many tiles each stage evaluated compared to scanning the
+	# whole scene at the finest resolution
+	exhaustive = len(tile_origins(config.SCENE_SIZE[0], config.SCENE_SIZE[1],
+		int(config.CASCADE_RES[-1])))
+	evaluated = sum([stage["evaluated"] for stage in report])
+	for stage in report:
+		print("[INFO] {}px stage: {} tiles evaluated, {} kept".format(
+			stage["res"], stage["evaluated"], stage["kept"]))
+	print("[INFO] {} tiles evaluated in total vs {} for an exhaustive "
+		"{}px scan".format(evaluated, exhaustive, config.CASCADE_RES[-1]))
+	print("[INFO] cascade search took {:.2f}s".format(endTime - startTime))
+	if caches is not None:
+		for res in config.CASCADE_RES:
+			print("[INFO] {}px prediction cache: {}".format(res,
+				caches[res].summary()))
+
+	# draw the detections on the scene
+	for detection in detections:
+		(startX, startY, endX, endY) = detection["bbox"]
+		print("[INFO] waldo at {} with probability {:.4f}".format(
+			detection["bbox"], detection["prob"]))
+		cv2.rectangle(orig, (startX, startY), (endX, endY), (0, 255, 0), 2)
+	if args["display"]:
+		cv2.imshow("Output", orig)
+		cv2.waitKey(0)
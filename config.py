@@ -14,6 +14,11 @@ MODEL_PATH = os.path.sep.join([BASE_OUTPUT, "detector.pth"])
 LE_PATH = os.path.sep.join([BASE_OUTPUT, "le.pickle"])
 PLOTS_PATH = os.path.sep.join([BASE_OUTPUT, "plots"])
 TEST_PATHS = os.path.sep.join([BASE_OUTPUT, "test_paths.txt"])
+CACHE_PATH = os.path.sep.join([BASE_OUTPUT, "predictions.sqlite"])
+# define the paths to the per-resolution object detectors used by the
+# coarse-to-fine cascade search
+MODEL_PATHS = {res: os.path.sep.join([BASE_OUTPUT, f"detector-{res}.pth"])
+	for res in ("256", "128", "64")}
 
 # determine the current device and based on that set the pin memory
 # flag
@@ -27,9 +32,35 @@ STD = [0.229, 0.224, 0.225]
 INIT_LR = 1e-4
 NUM_EPOCHS = 20
 BATCH_SIZE = 32
+# specify whether to apply batched augmentation while training and the
+# seed for reproducible augmentation (None for a random seed)
+AUGMENT = True
+AUGMENT_SEED = None
+# specify the number of predictions the cache keeps in memory and the
+# maximum size of its on-disk tier in bytes
+CACHE_MEMORY_ITEMS = 4096
+CACHE_DISK_BYTES = 256 * 1024 * 1024
+# specify the IoU thresholds the detection evaluator computes AP at
+EVAL_IOU_THRESHOLDS = [0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95]
 # specify the loss weights
 LABELS = 1.0
 BBOX = 1.0
 
 # define the desired resolution of the input images
-DESIRED_RES = "256"
\ No newline at end of file
+DESIRED_RES = "256"
+
+# define the size full scenes were cropped and resized to before being
+# chopped into training patches
+SCENE_SIZE = (1024, 1024)
+
+# define the cascade stages (coarse to fine) and the minimum waldo
+# probability a tile must reach at each stage to be refined further
+CASCADE_RES = ["256", "128", "64"]
+CASCADE_THRESHOLDS = {"256": 0.2, "128": 0.3, "64": 0.5}
+
+# define the mean absolute pixel difference above which a tile counts as
+# changed between frames, the minimum waldo probability reported, and the
+# size of the queues between the streaming pipeline stages
+STREAM_DIFF_THRESHOLD = 2.0
+STREAM_PROB_THRESHOLD = 0.5
+STREAM_QUEUE_SIZE = 8
\ No newline at end of file
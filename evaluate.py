@@ -0,0 +1,229 @@
+# USAGE
+# python evaluate.py
+# python evaluate.py --input output/test_paths.txt
+# import the necessary packages
+import config
+import torch
+
+def box_iou(boxesA, boxesB):
+    """
+    Computes the IoU between paired boxes.
+
+    Parameters:
+        boxesA (torch.Tensor): Boxes of shape (N, 4) as (startX, startY, endX, endY).
+        boxesB (torch.Tensor): Boxes of shape (N, 4) in the same format.
+
+    Returns:
+        torch.Tensor: IoU of shape (N,), 0 where both boxes are empty.
+    """
+    x0 = torch.max(boxesA[:, 0], boxesB[:, 0])
+    y0 = torch.max(boxesA[:, 1], boxesB[:, 1])
+    x1 = torch.min(boxesA[:, 2], boxesB[:, 2])
+    y1 = torch.min(boxesA[:, 3], boxesB[:, 3])
+    inter = (x1 - x0).clamp(min=0) * (y1 - y0).clamp(min=0)
+    areaA = ((boxesA[:, 2] - boxesA[:, 0]).clamp(min=0) *
+        (boxesA[:, 3] - boxesA[:, 1]).clamp(min=0))
+    areaB = ((boxesB[:, 2] - boxesB[:, 0]).clamp(min=0) *
+        (boxesB[:, 3] - boxesB[:, 1]).clamp(min=0))
+    union = areaA + areaB - inter
+    return torch.where(union > 0, inter / union.clamp(min=1e-12),
+        torch.zeros_like(union))
+
+
+def average_precision(scores, matches, numPositives):
+    """
+    Computes precision/recall curves and all-point interpolated AP for several
+    IoU thresholds at once.
+
+    Parameters:
+        scores (torch.Tensor): Detection scores of shape (N,).
+        matches (torch.Tensor): Boolean (T, N), True where detection n is a true
+                                positive at IoU threshold t.
+        numPositives (int): Number of ground truth objects.
+
+    Returns:
+        tuple: (ap, precision, recall) of shapes (T,), (T, N) and (T, N).
+    """
+    order = scores.argsort(descending=True)
+    tp = matches[:, order].float()
+    tpCum = tp.cumsum(dim=1)
+    fpCum = (1 - tp).cumsum(dim=1)
+    recall = tpCum / max(numPositives, 1)
+    precision = tpCum / (tpCum + fpCum).clamp(min=1)
+    # make precision monotonically decreasing and integrate it over recall
+    envelope = precision.flip(1).cummax(dim=1).values.flip(1)
+    recallPrev = torch.cat([torch.zeros_like(recall[:, :1]), recall[:, :-1]],
+        dim=1)
+    ap = ((recall - recallPrev) * envelope).sum(dim=1)
+    return (ap, precision, recall)
+
+
+class DetectionEvaluator:
+    """
+    Accumulates predictions and ground truth across batches and computes box
+    and classification metrics in vectorized form.
+
+    Parameters:
+        numClasses (int): Number of classes predicted by the classifier.
+        positiveIdx (int): Index of the class that carries a bounding box (waldo).
+        iouThresholds (list): IoU thresholds to compute AP at.
+    """
+    def __init__(self, numClasses, positiveIdx,
+        iouThresholds=config.EVAL_IOU_THRESHOLDS):
+        self.numClasses = numClasses
+        self.positiveIdx = positiveIdx
+        self.iouThresholds = torch.tensor(iouThresholds)
+        self.reset()
+
+    def reset(self):
+        self.boxPreds = []
+        self.probs = []
+        self.bboxes = []
+        self.labels = []
+
+    def update(self, boxPreds, classScores, bboxes, labels, logits=True):
+        """
+        Adds a batch of model outputs and targets to the evaluator. The class
+        scores are raw logits by default, or probabilities with logits=False.
+        """
+        self.boxPreds.append(boxPreds.detach().float().cpu())
+        classScores = classScores.detach().float()
+        if logits:
+            classScores = torch.softmax(classScores, dim=-1)
+        self.probs.append(classScores.cpu())
+        self.bboxes.append(bboxes.detach().float().cpu())
+        self.labels.append(labels.detach().cpu())
+
+    def compute(self):
+        """
+        Returns:
+            dict: "accuracy", per-class "precision" and "recall" lists, "mean_iou"
+                  over positive samples, the "iou_thresholds" and the "ap" at
+                  each of them as aligned lists, "map" (mean AP over the
+                  thresholds), and the "pr_curve" at the first threshold.
+        """
+        boxPreds = torch.cat(self.boxPreds)
+        probs = torch.cat(self.probs)
+        bboxes = torch.cat(self.bboxes)
+        labels = torch.cat(self.labels)
+
+        # per-class classification precision and recall from a confusion
+        # matrix built in one pass
+        preds = probs.argmax(dim=1)
+        confusion = torch.bincount(labels * self.numClasses + preds,
+            minlength=self.numClasses ** 2).view(self.numClasses,
+            self.numClasses).float()
+        tp = confusion.diag()
+        precision = tp / confusion.sum(dim=0).clamp(min=1)
+        recall = tp / confusion.sum(dim=1).clamp(min=1)
+
+        # score every sample as a detection of the positive class, which is
+        # a true positive when it has a ground truth box overlapping enough
+        positive = labels == self.positiveIdx
+        iou = box_iou(boxPreds, bboxes)
+        matches = positive.unsqueeze(0) & (iou.unsqueeze(0) >=
+            self.iouThresholds.unsqueeze(1))
+        (ap, prPrecision, prRecall) = average_precision(
+            probs[:, self.positiveIdx], matches, int(positive.sum()))
+
+        return {
+            "accuracy": float(tp.sum() / confusion.sum().clamp(min=1)),
+            "precision": precision.tolist(),
+            "recall": recall.tolist(),
+            "mean_iou": float(iou[positive].mean()) if positive.any() else 0.0,
+            "iou_thresholds": self.iouThresholds.tolist(),
+            "ap": ap.tolist(),
+            "map": float(ap.mean()),
+            "pr_curve": (prPrecision[0].tolist(), prRecall[0].tolist()),
+        }
+
+
+def load_ground_truth(csvPath):
+    """
+    Loads the patch annotations CSV into a dictionary.
+
+    Parameters:
+        csvPath (str): Path to a patch_annotations_<res>.csv file.
+
+    Returns:
+        dict: Filename -> (label, [startX, startY, endX, endY]) in pixels, with a
+              zero box for patches without waldo.
+    """
+    groundTruth = {}
+    rows = open(csvPath).read().strip().split("\n")[1:]
+    for row in rows:
+        (filename, _, _, label, startX, startY, endX, endY) = row.split(",")
+        if startX == "" or startY == "" or endX == "" or endY == "":
+            startX = startY = endX = endY = "0"
+        groundTruth[filename] = (label.strip().lower(),
+            [float(startX), float(startY), float(endX), float(endY)])
+    return groundTruth
+
+
+if __name__ == "__main__":
+    # import the packages only needed for the command line evaluation
+    from inference import LazyDetector
+    from inference import load_labels
+    from inference import predict_images
+    from prediction_cache import PredictionCache
+    import argparse
+    import cv2
+    import os
+
+    # construct the argument parser and parse the arguments
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-i", "--input", default=config.TEST_PATHS,
+        help="path to text file of test image paths")
+    ap.add_argument("-r", "--res", default=config.DESIRED_RES,
+        help="resolution of the test patches")
+    ap.add_argument("-n", "--no-cache", action="store_true",
+        help="disable the prediction cache")
+    args = vars(ap.parse_args())
+
+    # load the object detector, the ground truth and the test images
+    print("[INFO] loading object detector...")
+    modelPath = config.MODEL_PATHS[args["res"]]
+    model = LazyDetector(modelPath)
+    le = load_labels(modelPath)
+    groundTruth = load_ground_truth(os.path.sep.join([config.ANNOTS_PATH,
+        f"patch_annotations_{args['res']}.csv"]))
+    imagePaths = open(args["input"]).read().strip().split("\n")
+    images = []
+    labels = []
+    bboxes = []
+    for imagePath in imagePaths:
+        filename = os.path.basename(imagePath)
+        if filename not in groundTruth:
+            print(f"[ERROR] No annotation for {imagePath}.")
+            continue
+        image = cv2.imread(imagePath)
+        if image is None:
+            print(f"[ERROR] Unable to load image {imagePath}.")
+            continue
+        (h, w) = image.shape[:2]
+        (label, bbox) = groundTruth[filename]
+        images.append(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+        labels.append(label)
+        bboxes.append([bbox[0] / w, bbox[1] / h, bbox[2] / w, bbox[3] / h])
+
+    # run the detector over the test set and evaluate it
+    print("[INFO] evaluating {} images...".format(len(images)))
+    cache = None if args["no_cache"] else PredictionCache(modelPath)
+    (boxPreds, probs) = predict_images(model, images, cache=cache)
+    if cache is not None:
+        print("[INFO] prediction cache: {}".format(cache.summary()))
+    evaluator = DetectionEvaluator(len(le.classes_),
+        list(le.classes_).index("waldo"))
+    evaluator.update(boxPreds, probs, torch.tensor(bboxes),
+        torch.tensor(le.transform(labels)), logits=False)
+    metrics = evaluator.compute()
+
+    # print the evaluation metrics
+    for (i, name) in enumerate(le.classes_):
+        print("[INFO] {}: precision {:.4f}, recall {:.4f}".format(name,
+            metrics["precision"][i], metrics["recall"][i]))
+    print("[INFO] accuracy: {:.4f}".format(metrics["accuracy"]))
+    print("[INFO] mean IoU: {:.4f}".format(metrics["mean_iou"]))
+    for (t, score) in zip(metrics["iou_thresholds"], metrics["ap"]):
+        print("[INFO] AP@{:.2f}: {:.4f}".format(t, score))
+    print("[INFO] mAP: {:.4f}".format(metrics["map"]))
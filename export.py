@@ -0,0 +1,29 @@
+# USAGE
+# python export.py
+# python export.py --model output/detector-64.pth --res 64
+# import the necessary packages
+from inference import save_artifact
+from inference import artifact_paths
+import config
+import argparse
+import pickle
+import torch
+
+# construct the argument parser and parse the arguments
+ap = argparse.ArgumentParser()
+ap.add_argument("-m", "--model", default=config.MODEL_PATH,
+	help="path to the serialized object detector")
+ap.add_argument("-r", "--res", default=config.DESIRED_RES,
+	help="resolution of the patches the model was trained on")
+args = vars(ap.parse_args())
+
+# load the full object detector and label encoder from disk
+print("[INFO] loading object detector...")
+model = torch.load(args["model"], map_location="cpu", weights_only=False)
+le = pickle.loads(open(config.LE_PATH, "rb").read())
+
+# write the compact weights and metadata next to the model
+(weightsPath, metaPath) = artifact_paths(args["model"])
+print("[INFO] saving inference artifact to {} and {}...".format(
+	weightsPath, metaPath))
+save_artifact(model, le, args["res"], args["model"])
@@ -0,0 +1,358 @@
+# import the necessary packages
+import config
+import hashlib
+import json
+import torch
+import cv2
+import os
+
+# metadata files already reported as stale, so the warning is printed once
+STALE_ARTIFACTS = set()
+
+class ClassLabels:
+    """
+    Maps between class names and indices with the parts of the scikit-learn
+    LabelEncoder interface used at inference time, without importing sklearn.
+    """
+    def __init__(self, classes):
+        self.classes_ = list(classes)
+
+    def transform(self, labels):
+        return [self.classes_.index(label) for label in labels]
+
+    def inverse_transform(self, indices):
+        return [self.classes_[int(i)] for i in indices]
+
+
+def artifact_paths(modelPath):
+    """Returns the (weights, metadata) paths of the artifact for a model path."""
+    base = os.path.splitext(modelPath)[0]
+    return (base + ".weights.pt", base + ".json")
+
+
+def model_signature(modelPath, chunkSize=1 << 20):
+    """
+    Returns the [size, sha256] of a model file, hashing only its first and
+    last chunkSize bytes so it stays cheap for large files, or None if it is
+    missing. Unlike the modification time it survives copies and downloads.
+    """
+    if not os.path.exists(modelPath):
+        return None
+    size = os.path.getsize(modelPath)
+    h = hashlib.sha256()
+    f = open(modelPath, "rb")
+    h.update(f.read(chunkSize))
+    if size > chunkSize:
+        f.seek(max(size - chunkSize, chunkSize))
+        h.update(f.read(chunkSize))
+    f.close()
+    return [size, h.hexdigest()]
+
+
+def save_artifact(model, le, res, modelPath):
+    """
+    Writes the compact inference artifact for a model: its state_dict, which
+    can be memory-mapped at load time, and a small JSON metadata file with
+    everything needed to rebuild and run the detector. The signature of the
+    model file is recorded so a replaced model invalidates the artifact.
+
+    Parameters:
+        model (ObjectDetector): The trained detector.
+        le (LabelEncoder): The fitted label encoder.
+        res (str): Resolution of the patches the model was trained on.
+        modelPath (str): Path of the full serialized model the artifact sits next to.
+    """
+    (weightsPath, metaPath) = artifact_paths(modelPath)
+    state = {k: v.detach().cpu() for (k, v) in model.state_dict().items()}
+    torch.save(state, weightsPath)
+    h = hashlib.sha256()
+    f = open(weightsPath, "rb")
+    for chunk in iter(lambda: f.read(1 << 20), b""):
+        h.update(chunk)
+    f.close()
+    meta = {"classes": [str(c) for c in le.classes_], "input_size": 224,
+        "mean": config.MEAN, "std": config.STD, "res": res,
+        "sha256": h.hexdigest(), "model": model_signature(modelPath)}
+    f = open(metaPath, "w")
+    f.write(json.dumps(meta, indent=2))
+    f.close()
+
+
+def load_artifact(modelPath):
+    """
+    Rebuilds the detector from its compact artifact. Weights are memory-mapped
+    into a model constructed on the meta device, so no pretrained weights are
+    downloaded and no random initialization is done.
+
+    Returns:
+        tuple: (model, labels) with the model in evaluation mode on config.DEVICE.
+    """
+    # these are only needed to construct the model, so import them here
+    from torchvision.models import resnet50
+    from bbox_regressor import ObjectDetector
+
+    (weightsPath, metaPath) = artifact_paths(modelPath)
+    meta = load_metadata(modelPath)
+    state = torch.load(weightsPath, map_location="cpu", mmap=True,
+        weights_only=True)
+    with torch.device("meta"):
+        model = ObjectDetector(resnet50(), len(meta["classes"]))
+    model.load_state_dict(state, assign=True)
+    model.meta = meta
+    model = model.to(config.DEVICE)
+    model.eval()
+    return (model, ClassLabels(meta["classes"]))
+
+
+def load_metadata(modelPath):
+    """
+    Returns the artifact metadata for a model path, or None when there is no
+    artifact or it no longer matches the model file next to it (for example
+    after the model was replaced without re-exporting). An artifact without
+    its model file is trusted as is.
+    """
+    metaPath = artifact_paths(modelPath)[1]
+    if not os.path.exists(metaPath):
+        return None
+    meta = json.loads(open(metaPath).read())
+    signature = model_signature(modelPath)
+    if signature is not None and meta.get("model") != signature:
+        if metaPath not in STALE_ARTIFACTS:
+            STALE_ARTIFACTS.add(metaPath)
+            print(f"[WARNING] {metaPath} does not match {modelPath}, loading "
+                "the full model instead (re-run export.py to refresh it).")
+        return None
+    return meta
+
+
+def load_labels(modelPath, lePath=config.LE_PATH):
+    """
+    Loads the class labels of a model from its artifact metadata, falling back
+    to the pickled label encoder.
+    """
+    meta = load_metadata(modelPath)
+    if meta is not None:
+        return ClassLabels(meta["classes"])
+    import pickle
+    return pickle.loads(open(lePath, "rb").read())
+
+
+def load_detector(modelPath, lePath=config.LE_PATH):
+    """
+    Loads an object detector and its class labels, preferring the compact
+    artifact next to modelPath and falling back to the pickled model and
+    label encoder.
+
+    Parameters:
+        modelPath (str): Path to the serialized ObjectDetector.
+        lePath (str): Path to the pickled LabelEncoder.
+
+    Returns:
+        tuple: (model, le) with the model in evaluation mode on config.DEVICE.
+    """
+    if load_metadata(modelPath) is not None:
+        return load_artifact(modelPath)
+    model = torch.load(modelPath, weights_only=False).to(config.DEVICE)
+    model.eval()
+    return (model, load_labels(modelPath, lePath))
+
+
+class LazyDetector:
+    """
+    Stands in for an object detector and only loads it from disk the first
+    time it is called, so runs served entirely from the prediction cache never
+    pay for loading the model.
+
+    Parameters:
+        modelPath (str): Path to the serialized ObjectDetector.
+        lePath (str): Path to the pickled LabelEncoder.
+    """
+    def __init__(self, modelPath, lePath=config.LE_PATH):
+        self.modelPath = modelPath
+        self.lePath = lePath
+        self.meta = load_metadata(modelPath)
+        self.model = None
+
+    def load(self):
+        if self.model is None:
+            (self.model, _) = load_detector(self.modelPath, self.lePath)
+        return self.model
+
+    @property
+    def numClasses(self):
+        if self.meta is not None:
+            return len(self.meta["classes"])
+        return self.load().numClasses
+
+    def __call__(self, batch):
+        return self.load()(batch)
+
+
+def preprocessing(meta):
+    """Returns the (input size, mean, std) a model with this metadata expects."""
+    if meta is None:
+        return (224, config.MEAN, config.STD)
+    return (meta["input_size"], meta["mean"], meta["std"])
+
+
+def preprocess_images(images, size=224, mean=config.MEAN, std=config.STD):
+    """
+    Converts a list of RGB images into a single normalized batch tensor. This is
+    the batched equivalent of the ToPILImage/ToTensor/Normalize transforms.
+
+    Parameters:
+        images (list): RGB uint8 images as NumPy arrays of shape (H, W, 3).
+        size (int): Width/height the images are resized to.
+        mean (list): Per-channel mean to normalize with.
+        std (list): Per-channel standard deviation to normalize with.
+
+    Returns:
+        torch.Tensor: Batch of shape (N, 3, size, size) on config.DEVICE.
+    """
+    batch = [torch.from_numpy(cv2.resize(image, (size, size))) for image in images]
+    batch = torch.stack(batch).to(config.DEVICE)
+    batch = batch.permute(0, 3, 1, 2).float().div(255.0)
+    mean = torch.tensor(mean, device=batch.device).view(1, 3, 1, 1)
+    std = torch.tensor(std, device=batch.device).view(1, 3, 1, 1)
+    return (batch - mean) / std
+
+
+def predict_images(model, images, batchSize=config.BATCH_SIZE, cache=None):
+    """
+    Runs the object detector over a list of RGB images in mini-batches.
+
+    Parameters:
+        model (ObjectDetector): The trained detector in evaluation mode, or a
+                                LazyDetector.
+        images (list): RGB uint8 images as NumPy arrays of shape (H, W, 3).
+        batchSize (int): Number of images per forward pass.
+        cache (PredictionCache): Optional cache consulted before running the
+                                 model; only uncached images are predicted.
+
+    Returns:
+        tuple: (boxes, probs) as CPU tensors of shape (N, 4) and (N, numClasses).
+               Boxes are normalized (startX, startY, endX, endY) coordinates.
+    """
+    if cache is not None:
+        keys = [cache.key(image) for image in images]
+        results = [cache.get(key) for key in keys]
+        missing = [i for (i, result) in enumerate(results) if result is None]
+        # only touch the model when something was not cached
+        if len(missing) > 0:
+            (boxes, probs) = predict_images(model,
+                [images[i] for i in missing], batchSize)
+            for (j, i) in enumerate(missing):
+                results[i] = (boxes[j].tolist(), probs[j].tolist())
+                cache.put(keys[i], results[i][0], results[i][1])
+        if len(results) == 0:
+            return predict_images(model, [], batchSize)
+        return (torch.tensor([box for (box, _) in results]),
+            torch.tensor([prob for (_, prob) in results]))
+    (size, mean, std) = preprocessing(getattr(model, "meta", None))
+    boxes = []
+    probs = []
+    with torch.no_grad():
+        for i in range(0, len(images), batchSize):
+            batch = preprocess_images(images[i:i + batchSize], size, mean, std)
+            (boxPreds, labelPreds) = model(batch)
+            boxes.append(boxPreds.cpu())
+            probs.append(torch.nn.Softmax(dim=-1)(labelPreds).cpu())
+    if len(boxes) == 0:
+        return (torch.zeros((0, 4)), torch.zeros((0, model.numClasses)))
+    return (torch.cat(boxes), torch.cat(probs))
+
+
+def tile_origins(width, height, tileSize, region=None, edges=False):
+    """
+    Computes the top-left corners of the square tiles covering an image or a
+    region of it. By default partial tiles along the right and bottom edges
+    are dropped, matching chop_cropped_images.
+
+    Parameters:
+        width (int): Width of the image.
+        height (int): Height of the image.
+        tileSize (int): The width/height of each square tile.
+        region (tuple): Optional (x, y, size) square to tile instead of the full image.
+        edges (bool): Whether to add a final row/column of tiles aligned with the
+                      right and bottom edges so every pixel is covered.
+
+    Returns:
+        list: (x, y) tile origins in image coordinates.
+    """
+    if region is None:
+        (x0, y0, x1, y1) = (0, 0, width, height)
+    else:
+        (x0, y0, size) = region
+        (x1, y1) = (min(x0 + size, width), min(y0 + size, height))
+    xs = list(range(x0, x1 - tileSize + 1, tileSize))
+    ys = list(range(y0, y1 - tileSize + 1, tileSize))
+    if edges and len(xs) > 0 and xs[-1] + tileSize < x1:
+        xs.append(x1 - tileSize)
+    if edges and len(ys) > 0 and ys[-1] + tileSize < y1:
+        ys.append(y1 - tileSize)
+    return [(x, y) for x in xs for y in ys]
+
+
+def crop_tiles(image, origins, tileSize):
+    """Crops the square tiles at the given origins out of an image."""
+    return [image[y:y + tileSize, x:x + tileSize] for (x, y) in origins]
+
+
+def tile_box_to_image(box, origin, tileSize):
+    """
+    Maps a normalized box predicted for a tile back to image pixel coordinates.
+
+    Parameters:
+        box (sequence): Normalized (startX, startY, endX, endY) within the tile.
+        origin (tuple): (x, y) of the top-left corner of the tile.
+        tileSize (int): The width/height of the tile.
+
+    Returns:
+        list: [startX, startY, endX, endY] in image pixel coordinates.
+    """
+    (x, y) = origin
+    (startX, startY, endX, endY) = [float(v) for v in box]
+    return [int(x + startX * tileSize), int(y + startY * tileSize),
+        int(x + endX * tileSize), int(y + endY * tileSize)]
+
+
+def fit_scene(image, dimensions=config.SCENE_SIZE, crop=True):
+    """
+    Crops and resizes a scene to the dimensions the training patches were cut
+    from, mirroring the ImageOps.fit call in crop_and_size_with_bbox. Shrinking
+    uses area interpolation, which antialiases like PIL's LANCZOS filter does.
+
+    Parameters:
+        image (ndarray): The scene image.
+        dimensions (tuple): Target dimensions (width, height).
+        crop (bool): Whether to crop to the target aspect ratio. Without it the
+                     whole scene is kept and only rescaled by the same factor.
+
+    Returns:
+        tuple: (fitted, scale, offset) where offset is the (x, y) crop offset in
+               scaled coordinates, as computed by crop_and_size_with_bbox.
+    """
+    (targetW, targetH) = dimensions
+    (h, w) = image.shape[:2]
+    scale = max(targetW / w, targetH / h)
+    inter = cv2.INTER_AREA if scale < 1 else cv2.INTER_LANCZOS4
+    if not crop:
+        fitted = cv2.resize(image, (int(round(w * scale)),
+            int(round(h * scale))), interpolation=inter)
+        return (fitted, scale, (0, 0))
+    offset = ((w * scale - targetW) / 2, (h * scale - targetH) / 2)
+    # crop the centred region of the original that maps onto the target
+    x0 = int(round(offset[0] / scale))
+    y0 = int(round(offset[1] / scale))
+    cropW = int(round(targetW / scale))
+    cropH = int(round(targetH / scale))
+    fitted = cv2.resize(image[y0:y0 + cropH, x0:x0 + cropW],
+        (targetW, targetH), interpolation=inter)
+    return (fitted, scale, offset)
+
+
+def fitted_box_to_image(box, scale, offset):
+    """Maps a box in fitted scene coordinates back to the original scene."""
+    (startX, startY, endX, endY) = box
+    return [int((startX + offset[0]) / scale), int((startY + offset[1]) / scale),
+        int((endX + offset[0]) / scale), int((endY + offset[1]) / scale)]
@@ -1,18 +1,23 @@
 # USAGE
 # python predict.py --input dataset/images/face/image_0131.jpg
-# import the necessary packages
+# import the necessary packages, starting the clock first so the time to
+# the first prediction includes the imports
+import time
+startTime = time.time()
+from inference import LazyDetector
+from inference import load_labels
+from inference import predict_images
+from prediction_cache import PredictionCache
 import config
-from torchvision import transforms
 import mimetypes
 import argparse
-import imutils
-import pickle
-import torch
 import cv2
 # construct the argument parser and parse the arguments
 ap = argparse.ArgumentParser()
 ap.add_argument("-i", "--input", required=True,
 	help="path to input image/text file of image paths")
+ap.add_argument("-n", "--no-cache", action="store_true",
+	help="disable the prediction cache")
 args = vars(ap.parse_args())
 
 # determine the input file type, but assume that we're working with
@@ -25,48 +30,39 @@ if "text/plain" == filetype:
 	# load the image paths in our testing file
 	imagePaths = open(args["input"]).read().strip().split("\n")
 	
-# load our object detector, set it evaluation mode, and label
-# encoder from disk
+# set up our object detector and load the class labels from disk; the
+# model itself is only read on the first prediction cache miss
 print("[INFO] loading object detector...")
-model = torch.load(config.MODEL_PATH).to(config.DEVICE)
-model.eval()
-le = pickle.loads(open(config.LE_PATH, "rb").read())
-# define normalization transforms
-transforms = transforms.Compose([
-	transforms.ToPILImage(),
-	transforms.ToTensor(),
-	transforms.Normalize(mean=config.MEAN, std=config.STD)
-])
+model = LazyDetector(config.MODEL_PATH)
+le = load_labels(config.MODEL_PATH)
+# initialize the prediction cache so repeated images skip the forward pass
+cache = None if args["no_cache"] else PredictionCache(config.MODEL_PATH)
 
 # loop over the images that we'll be testing using our bounding box
 # regression model
-for imagePath in imagePaths:
-	# load the image, copy it, swap its colors channels, resize it, and
-	# bring its channel dimension forward
+for (n, imagePath) in enumerate(imagePaths):
+	# load the image, copy it, and swap its colors channels
 	image = cv2.imread(imagePath)
 	orig = image.copy()
 	image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-	image = cv2.resize(image, (224, 224))
-	image = image.transpose((2, 0, 1))
-	# convert image to PyTorch tensor, normalize it, flash it to the
-	# current device, and add a batch dimension
-	image = torch.from_numpy(image)
-	image = transforms(image).to(config.DEVICE)
-	image = image.unsqueeze(0)
 	
     # predict the bounding box of the object along with the class
-	# label
-	(boxPreds, labelPreds) = model(image)
+	# label, reusing a cached prediction if we have seen the image
+	(boxPreds, labelPreds) = predict_images(model, [image], cache=cache)
 	(startX, startY, endX, endY) = boxPreds[0]
 	# determine the class label with the largest predicted
 	# probability
-	labelPreds = torch.nn.Softmax(dim=-1)(labelPreds)
-	i = labelPreds.argmax(dim=-1).cpu()
+	i = labelPreds.argmax(dim=-1)
 	label = le.inverse_transform(i)[0]
+	if n == 0:
+		print("[INFO] time to first prediction: {:.2f}s".format(
+			time.time() - startTime))
 	
     # resize the original image such that it fits on our screen, and
 	# grab its dimensions
-	orig = imutils.resize(orig, width=600)
+	(h, w) = orig.shape[:2]
+	orig = cv2.resize(orig, (600, int(h * 600 / w)),
+		interpolation=cv2.INTER_AREA)
 	(h, w) = orig.shape[:2]
 	# scale the predicted bounding box coordinates based on the image
 	# dimensions
@@ -82,4 +78,8 @@ for imagePath in imagePaths:
 		(0, 255, 0), 2)
 	# show the output image 
 	cv2.imshow("Output", orig)
-	cv2.waitKey(0)
\ No newline at end of file
+	cv2.waitKey(0)
+
+# report how many predictions were served from the cache
+if cache is not None:
+	print("[INFO] prediction cache: {}".format(cache.summary()))
\ No newline at end of file
@@ -0,0 +1,149 @@
+# import the necessary packages
+from inference import preprocessing
+from inference import load_metadata
+from inference import model_signature
+from collections import OrderedDict
+import numpy as np
+import config
+import hashlib
+import sqlite3
+import json
+import time
+import os
+
+def model_fingerprint(modelPath):
+    """
+    Identifies the weights of a model file without loading it, so cached
+    predictions follow retraining. Artifacts carry the hash of their weights;
+    otherwise the size and partial content hash of the model file are used.
+    """
+    meta = load_metadata(modelPath)
+    if meta is not None:
+        return meta["sha256"]
+    (size, digest) = model_signature(modelPath)
+    return "{}:{}".format(size, digest)
+
+
+class PredictionCache:
+    """
+    Caches detector outputs keyed on the content hash of the input image, the
+    model weights and the preprocessing parameters. Lookups go through an
+    in-memory LRU tier first and an on-disk tier second. The disk tier is a
+    single SQLite file whose size is tracked from its page counts; it evicts
+    its least recently used entries once it grows past maxBytes.
+
+    Parameters:
+        modelPath (str): Path to the detector whose predictions are cached.
+        cachePath (str): Path of the on-disk SQLite file, or None to disable it.
+        maxItems (int): Maximum number of entries kept in memory.
+        maxBytes (int): Maximum size of the on-disk tier in bytes.
+    """
+    def __init__(self, modelPath, cachePath=config.CACHE_PATH,
+        maxItems=config.CACHE_MEMORY_ITEMS, maxBytes=config.CACHE_DISK_BYTES):
+        self.cachePath = cachePath
+        self.maxItems = maxItems
+        self.maxBytes = maxBytes
+        self.memory = OrderedDict()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        # everything besides the image that changes the model output
+        (size, mean, std) = preprocessing(load_metadata(modelPath))
+        params = {"model": model_fingerprint(modelPath), "size": size,
+            "mean": mean, "std": std}
+        self.prefix = json.dumps(params, sort_keys=True).encode()
+        # the disk tier is only opened on the first lookup that needs it
+        self.db = None
+
+    def key(self, image):
+        """Returns the cache key of an RGB uint8 image."""
+        h = hashlib.sha256(self.prefix)
+        h.update(str(image.shape).encode())
+        h.update(np.ascontiguousarray(image).tobytes())
+        return h.hexdigest()
+
+    def _connect(self):
+        if self.db is None:
+            directory = os.path.dirname(self.cachePath)
+            if directory != "":
+                os.makedirs(directory, exist_ok=True)
+            self.db = sqlite3.connect(self.cachePath)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS predictions "
+                "(key TEXT PRIMARY KEY, box TEXT, probs TEXT, used REAL)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS predictions_used "
+                "ON predictions (used)")
+        return self.db
+
+    def _disk_bytes(self):
+        # bytes held by pages in use, which includes SQLite's own overhead
+        db = self._connect()
+        pageSize = db.execute("PRAGMA page_size").fetchone()[0]
+        pageCount = db.execute("PRAGMA page_count").fetchone()[0]
+        freePages = db.execute("PRAGMA freelist_count").fetchone()[0]
+        return (pageCount - freePages) * pageSize
+
+    def _remember(self, key, value):
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.maxItems:
+            self.memory.popitem(last=False)
+
+    def get(self, key):
+        """
+        Returns:
+            tuple or None: (box, probs) lists for a cached image, otherwise None.
+        """
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return self.memory[key]
+        if self.cachePath is not None:
+            db = self._connect()
+            row = db.execute("SELECT box, probs FROM predictions WHERE key = ?",
+                (key,)).fetchone()
+            if row is not None:
+                # touch the entry so eviction drops the least recently used
+                db.execute("UPDATE predictions SET used = ? WHERE key = ?",
+                    (time.time(), key))
+                db.commit()
+                value = (json.loads(row[0]), json.loads(row[1]))
+                self._remember(key, value)
+                self.stats["disk_hits"] += 1
+                return value
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, key, box, probs):
+        """Stores the predicted box and class probabilities for a key."""
+        value = (list(box), list(probs))
+        self._remember(key, value)
+        if self.cachePath is None:
+            return
+        db = self._connect()
+        db.execute("INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value[0]), json.dumps(value[1]), time.time()))
+        db.commit()
+        if self._disk_bytes() > self.maxBytes:
+            self._evict()
+
+    def _evict(self):
+        # drop the least recently used entries until the disk tier is back
+        # down to about 90% of its budget; freed pages are reused by SQLite
+        db = self._connect()
+        used = self._disk_bytes()
+        count = db.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+        drop = count - int(count * 0.9 * self.maxBytes / used)
+        db.execute("DELETE FROM predictions WHERE key IN (SELECT key FROM "
+            "predictions ORDER BY used LIMIT ?)", (max(drop, 1),))
+        db.commit()
+
+    def hit_rate(self):
+        lookups = sum(self.stats.values())
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        return hits / lookups if lookups > 0 else 0.0
+
+    def summary(self):
+        return ("{} lookups, {} memory hits, {} disk hits, {} misses "
+            "({:.1%} hit rate)").format(sum(self.stats.values()),
+            self.stats["memory_hits"], self.stats["disk_hits"],
+            self.stats["misses"], self.hit_rate())
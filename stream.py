@@ -0,0 +1,228 @@
+# USAGE
+# python stream.py --input video.mp4 --output output/detections.jsonl
+# python stream.py --input frames/ --output output/detections.jsonl
+# import the necessary packages
+from inference import LazyDetector
+from inference import load_labels
+from inference import predict_images
+from inference import tile_origins
+from inference import crop_tiles
+from inference import tile_box_to_image
+from inference import fit_scene
+from inference import fitted_box_to_image
+from prediction_cache import PredictionCache
+from imutils import paths
+from threading import Thread
+from queue import Queue
+import config
+import argparse
+import json
+import time
+import cv2
+import os
+
+def read_frames(source):
+	"""
+	Yields (name, frame) pairs from a video file or a directory of images,
+	where frame is a BGR image as loaded by OpenCV.
+	"""
+	if os.path.isdir(source):
+		for imagePath in sorted(paths.list_images(source)):
+			frame = cv2.imread(imagePath)
+			if frame is None:
+				print(f"[ERROR] Unable to load image {imagePath}.")
+				continue
+			yield (imagePath, frame)
+		return
+	vs = cv2.VideoCapture(source)
+	if not vs.isOpened():
+		raise IOError(f"Unable to open video {source}")
+	i = 0
+	while True:
+		(grabbed, frame) = vs.read()
+		if not grabbed:
+			break
+		yield (f"{source}#{i}", frame)
+		i += 1
+	vs.release()
+
+
+def run_stage(func, inQueue, outQueue):
+	"""
+	Starts a daemon thread that applies func to every item from inQueue and
+	passes the results on to outQueue until it receives None. An exception,
+	raised here or received from an upstream stage, is passed on in place of
+	a result, and the None sentinel is always sent so the consumer never
+	blocks on a dead stage.
+	"""
+	def loop():
+		try:
+			while True:
+				item = inQueue.get()
+				if item is None:
+					break
+				if isinstance(item, Exception):
+					outQueue.put(item)
+					break
+				outQueue.put(func(item))
+		except Exception as e:
+			outQueue.put(e)
+		finally:
+			outQueue.put(None)
+	thread = Thread(target=loop, daemon=True)
+	thread.start()
+	return thread
+
+
+class TileDiffer:
+	"""
+	Tiles frames and keeps the pixels each tile had when it was last sent to
+	the detector, so only tiles that changed since then are scored again.
+	Frames are rescaled like the training scenes, without cropping, and
+	tiled with edge-aligned final tiles so the whole frame is covered.
+
+	Parameters:
+		tileSize (int): The width/height of each square tile.
+		diffThreshold (float): Mean absolute pixel difference above which a
+		                       tile counts as changed.
+	"""
+	def __init__(self, tileSize, diffThreshold=config.STREAM_DIFF_THRESHOLD):
+		self.tileSize = tileSize
+		self.diffThreshold = diffThreshold
+		self.shape = None
+		self.reference = []
+
+	def __call__(self, item):
+		(name, frame) = item
+		image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+		(image, scale, offset) = fit_scene(image, config.SCENE_SIZE,
+			crop=False)
+		(h, w) = image.shape[:2]
+		origins = tile_origins(w, h, self.tileSize, edges=True)
+		tiles = crop_tiles(image, origins, self.tileSize)
+		# start over whenever the frame size changes
+		if image.shape != self.shape:
+			self.shape = image.shape
+			self.reference = [None] * len(tiles)
+		changed = []
+		for (i, tile) in enumerate(tiles):
+			ref = self.reference[i]
+			if ref is None or cv2.absdiff(tile, ref).mean() > self.diffThreshold:
+				self.reference[i] = tile.copy()
+				changed.append(i)
+		return (name, origins, changed, [tiles[i] for i in changed], scale,
+			offset)
+
+
+def stream_detections(source, model, waldoIdx, tileSize,
+	diffThreshold=config.STREAM_DIFF_THRESHOLD,
+	probThreshold=config.STREAM_PROB_THRESHOLD, cache=None):
+	"""
+	Runs the detector over a stream of frames with decoding and tiling in
+	background threads overlapping inference, reusing the results of tiles
+	that have not changed since they were last scored.
+
+	Parameters:
+		source (str): Video file or directory of images.
+		model (ObjectDetector): The trained detector in evaluation mode.
+		waldoIdx (int): Index of the "waldo" class in the classifier output.
+		tileSize (int): The width/height of the tiles the detector was trained on.
+		diffThreshold (float): Mean absolute pixel difference for a changed tile.
+		probThreshold (float): Minimum waldo probability to report a detection.
+		cache (PredictionCache): Optional cache consulted for the changed tiles.
+
+	Yields:
+		dict: Per-frame record with the frame "name", its "detections" in frame
+		      coordinates and the number of tiles "evaluated" and "reused".
+	"""
+	frameQueue = Queue(maxsize=config.STREAM_QUEUE_SIZE)
+	tileQueue = Queue(maxsize=config.STREAM_QUEUE_SIZE)
+
+	# decode frames in one thread and tile/diff them in another
+	def decode():
+		try:
+			for item in read_frames(source):
+				frameQueue.put(item)
+		except Exception as e:
+			frameQueue.put(e)
+		finally:
+			frameQueue.put(None)
+	Thread(target=decode, daemon=True).start()
+	run_stage(TileDiffer(tileSize, diffThreshold), frameQueue, tileQueue)
+
+	# score the changed tiles and merge them with the cached results
+	results = []
+	while True:
+		item = tileQueue.get()
+		if item is None:
+			break
+		# re-raise any error from the decoding or tiling threads
+		if isinstance(item, Exception):
+			raise item
+		(name, origins, changed, tiles, scale, offset) = item
+		if len(results) != len(origins):
+			results = [None] * len(origins)
+		# frames identical to the previous one need no forward pass at all
+		if len(tiles) > 0:
+			(boxes, probs) = predict_images(model, tiles, cache=cache)
+			for (j, i) in enumerate(changed):
+				results[i] = (boxes[j], float(probs[j, waldoIdx]))
+		detections = [{"bbox": fitted_box_to_image(tile_box_to_image(box,
+			origins[i], tileSize), scale, offset), "prob": prob}
+			for (i, (box, prob)) in enumerate(results)
+			if prob >= probThreshold]
+		yield {"name": name, "detections": detections,
+			"evaluated": len(changed), "reused": len(origins) - len(changed)}
+
+
+if __name__ == "__main__":
+	# construct the argument parser and parse the arguments
+	ap = argparse.ArgumentParser()
+	ap.add_argument("-i", "--input", required=True,
+		help="path to input video file or directory of frames")
+	ap.add_argument("-o", "--output", required=True,
+		help="path to output JSONL file of per-frame detections")
+	ap.add_argument("-d", "--diff", type=float,
+		default=config.STREAM_DIFF_THRESHOLD,
+		help="mean absolute pixel difference for a tile to be re-scored")
+	ap.add_argument("-t", "--threshold", type=float,
+		default=config.STREAM_PROB_THRESHOLD,
+		help="minimum waldo probability to report a detection")
+	ap.add_argument("-c", "--cache", action="store_true",
+		help="enable the prediction cache (off by default since video "
+		"tiles rarely repeat)")
+	args = vars(ap.parse_args())
+
+	# load our object detector
+	print("[INFO] loading object detector...")
+	model = LazyDetector(config.MODEL_PATH)
+	le = load_labels(config.MODEL_PATH)
+	waldoIdx = list(le.classes_).index("waldo")
+	cache = PredictionCache(config.MODEL_PATH) if args["cache"] else None
+
+	# loop over the stream and write one JSON record per frame
+	print("[INFO] streaming detections...")
+	numFrames = 0
+	evaluated = 0
+	reused = 0
+	f = open(args["output"], "w")
+	startTime = time.time()
+	for (i, record) in enumerate(stream_detections(args["input"], model,
+		waldoIdx, int(config.DESIRED_RES), diffThreshold=args["diff"],
+		probThreshold=args["threshold"], cache=cache)):
+		record["frame"] = i
+		f.write(json.dumps(record) + "\n")
+		numFrames += 1
+		evaluated += record["evaluated"]
+		reused += record["reused"]
+	endTime = time.time()
+	f.close()
+
+	# report the throughput and how much work tile reuse saved
+	elapsed = max(endTime - startTime, 1e-9)
+	print("[INFO] processed {} frames in {:.2f}s ({:.2f} FPS)".format(
+		numFrames, elapsed, numFrames / elapsed))
+	print("[INFO] {} tiles evaluated, {} tiles reused".format(evaluated,
+		reused))
+	if cache is not None:
+		print("[INFO] prediction cache: {}".format(cache.summary()))
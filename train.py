@@ -3,6 +3,9 @@
 # import the necessary packages
 from bbox_regressor import ObjectDetector
 from custom_tensor_dataset import CustomTensorDataset
+from augmentation import BatchAugmentation
+from evaluate import DetectionEvaluator
+from inference import save_artifact
 import config
 from sklearn.preprocessing import LabelEncoder
 from torch.utils.data import DataLoader
@@ -173,10 +176,15 @@ for csvPath in paths.list_files(config.ANNOTS_PATH, validExts=(".csv")):
 	# initialize the optimizer, compile the model, and show the model
 	# summary
 	opt = Adam(objectDetector.parameters(), lr=config.INIT_LR)
+	# initialize the batched augmentation applied to training batches
+	augment = BatchAugmentation(seed=config.AUGMENT_SEED)
 	print(objectDetector)
 	# initialize a dictionary to store training history
 	H = {"total_train_loss": [], "total_val_loss": [], "train_class_acc": [],
-		"val_class_acc": []}
+		"val_class_acc": [], "val_map": []}
+	# initialize the detection evaluator run on the validation set
+	evaluator = DetectionEvaluator(len(le.classes_),
+		list(le.classes_).index("waldo"))
 	
 
 	# loop over epochs
@@ -198,6 +206,9 @@ for csvPath in paths.list_files(config.ANNOTS_PATH, validExts=(".csv")):
 			# send the input to the device
 			(images, labels, bboxes) = (images.to(config.DEVICE),
 				labels.to(config.DEVICE), bboxes.to(config.DEVICE))
+			# augment the whole batch on the device
+			if config.AUGMENT:
+				(images, bboxes) = augment(images, bboxes)
 			# perform a forward pass and calculate the training loss
 			predictions = objectDetector(images)
 			bboxLoss = bboxLossFunc(predictions[0], bboxes)
@@ -217,6 +228,7 @@ for csvPath in paths.list_files(config.ANNOTS_PATH, validExts=(".csv")):
 		with torch.no_grad():
 			# set the model in evaluation mode
 			objectDetector.eval()
+			evaluator.reset()
 			# loop over the validation set
 			for (images, labels, bboxes) in testLoader:
 				# send the input to the device
@@ -232,6 +244,8 @@ for csvPath in paths.list_files(config.ANNOTS_PATH, validExts=(".csv")):
 				# calculate the number of correct predictions
 				valCorrect += (predictions[1].argmax(1) == labels).type(
 					torch.float).sum().item()
+				evaluator.update(predictions[0], predictions[1], bboxes, labels)
+			metrics = evaluator.compute()
 				
 		# calculate the average training and validation loss
 		avgTrainLoss = totalTrainLoss / trainSteps
@@ -245,12 +259,16 @@ for csvPath in paths.list_files(config.ANNOTS_PATH, validExts=(".csv")):
 		H["train_class_acc"].append(trainCorrect)
 		H["total_val_loss"].append(avgValLoss.cpu().detach().numpy())
 		H["val_class_acc"].append(valCorrect)
+		H["val_map"].append(metrics["map"])
 		# print the model training and validation information
 		print("[INFO] EPOCH: {}/{}".format(e + 1, config.NUM_EPOCHS))
 		print("Train loss: {:.6f}, Train accuracy: {:.4f}".format(
 			avgTrainLoss, trainCorrect))
 		print("Val loss: {:.6f}, Val accuracy: {:.4f}".format(
 			avgValLoss, valCorrect))
+		print("Val mAP: {:.4f}, Val AP@{:.2f}: {:.4f}, Val mean IoU: {:.4f}".format(
+			metrics["map"], metrics["iou_thresholds"][0], metrics["ap"][0],
+			metrics["mean_iou"]))
 	endTime = time.time()
 	print("[INFO] total time taken to train the model: {:.2f}s".format(
 		endTime - startTime))
@@ -258,11 +276,18 @@ for csvPath in paths.list_files(config.ANNOTS_PATH, validExts=(".csv")):
 	# serialize the model to disk
 	print("[INFO] saving object detector model...")
 	torch.save(objectDetector, config.MODEL_PATH)
+	# keep a per-resolution copy for the coarse-to-fine cascade search
+	torch.save(objectDetector, config.MODEL_PATHS[res.group(1)])
 	# serialize the label encoder to disk
 	print("[INFO] saving label encoder...")
 	f = open(config.LE_PATH, "wb")
 	f.write(pickle.dumps(le))
 	f.close()
+	# write the compact inference artifacts loaded by the prediction scripts
+	print("[INFO] saving inference artifacts...")
+	save_artifact(objectDetector, le, res.group(1), config.MODEL_PATH)
+	save_artifact(objectDetector, le, res.group(1),
+		config.MODEL_PATHS[res.group(1)])
 	# plot the training loss and accuracy
 	plt.style.use("ggplot")
 	plt.figure()
@@ -270,6 +295,7 @@ for csvPath in paths.list_files(config.ANNOTS_PATH, validExts=(".csv")):
 	plt.plot(H["total_val_loss"], label="total_val_loss")
 	plt.plot(H["train_class_acc"], label="train_class_acc")
 	plt.plot(H["val_class_acc"], label="val_class_acc")
+	plt.plot(H["val_map"], label="val_map")
 	plt.title("Total Training Loss and Classification Accuracy on Dataset")
 	plt.xlabel("Epoch #")
 	plt.ylabel("Loss/Accuracy")